@@ -1,73 +1,57 @@
 import pandas as pd
 import numpy as np
-from itertools import combinations
-from utils import calculate_pair_statistics, calculate_hurst_exponent
+from utils import pair_results_frame
 
-def select_pairs_no_clustering(formation_data, formation_start_date, formation_end_date,
+def select_pairs_no_clustering(feature_cache, formation_start_date, formation_end_date,
                                trading_start_date, trading_end_date, trading_period_days):
-    adj_close_cols = [col for col in formation_data.columns if 'adj_close' in col]
-    etf_names = sorted(list(set([col.split('_')[0] for col in adj_close_cols])))
-    
-    if not adj_close_cols:
+    etf_names = feature_cache.etf_names
+    if not etf_names:
         print("No 'Adj_Close' columns found in the formation data.")
         return pd.DataFrame()
 
-    adj_close_df = formation_data[adj_close_cols]
-    adj_close_df.columns = etf_names
-
-    # Generate all possible pairs n(n-1)
-    pairs = list(combinations(etf_names, 2))
-    pair_results = []
+    # Generate all possible pairs n(n-1)/2 as index arrays into the price matrix
+    idx_i, idx_j = np.triu_indices(len(etf_names), 1)
     discrete_lags = [20, 50, 100, 200]  #  lags for Hurst computation
 
-    # Calculate statistics for each pair
-    for pair in pairs:
-        etf1, etf2 = pair
-        series1 = adj_close_df[etf1]
-        series2 = adj_close_df[etf2]
-        
-        stats = calculate_pair_statistics(series1, series2)
-        if stats:
-            # Compute and integrate the Hurst Exponent for the spread
-            spread = series1 - series2
-            hurst_results = calculate_hurst_exponent(spread.values, discrete_lags)
-            
-            # Store results
-            if isinstance(hurst_results, dict):
-                stats['Hurst_Exponent'] = hurst_results  # Store Hurst results for all lags
-            else:
-                stats['Hurst_Exponent'] = np.nan  # Handle errors gracefully
-            
-            pair_results.append(stats)
-
-    results_df = pd.DataFrame(pair_results)
+    # Correlation and spread std for every pair in one shot
+    correlations = feature_cache.C[idx_i, idx_j]
+    spread_stds = feature_cache.spread_std(idx_i, idx_j)
 
-    if 'Correlation' in results_df.columns:
-        results_df = results_df.dropna(subset=['Correlation'])
-    else:
+    # Both legs must be I(1); stationarity only depends on the ETF so test each once
+    non_stationary = feature_cache.non_stationary
+    candidates = non_stationary[idx_i] & non_stationary[idx_j] & ~np.isnan(correlations)
+    if not candidates.any():
         print("No valid pairs found with calculated Correlation.")
-        return pd.DataFrame()  # Return empty DataFrame if Correlation column is missing
+        return pd.DataFrame()  # Return empty DataFrame if no pair has a valid Correlation
 
     # Selection criteria
     correlation_threshold = 0.8
     cointegration_pvalue_threshold = 0.05
-    spread_std_threshold = results_df['Spread_STD'].median() if not results_df.empty else None
+    spread_std_threshold = np.median(spread_stds[candidates])
     min_half_life = 5
     max_half_life = trading_period_days
-    # average lag
-    results_df['Average_Hurst'] = results_df['Hurst_Exponent'].apply(
-        lambda x: np.mean(list(x.values())) if isinstance(x, dict) else np.nan
-    )
+
+    # Only pairs passing the correlation filter go through cointegration and Hurst
+    survivors = np.flatnonzero(candidates & (correlations >= correlation_threshold))
+    pair_i, pair_j = idx_i[survivors], idx_j[survivors]
+    stats = feature_cache.pair_statistics(pair_i, pair_j)
+
+    # Compute the Hurst Exponent for the spread at every lag, average lag
+    hurst = feature_cache.hurst_matrix(pair_i, pair_j, discrete_lags)
+    average_hurst = np.nanmean(hurst, axis=1) if len(hurst) else np.empty(0)
 
     # Select pairs based on selection criteria
-    selected_pairs = results_df[
-        (results_df['Correlation'] >= correlation_threshold) &
-        (results_df['Cointegration_PValue'] <= cointegration_pvalue_threshold) &
-        (results_df['Spread_STD'] <= spread_std_threshold) &
-        (results_df['Average_Hurst'] < 0.5) &                       #  criterion for Hurst Exponent 0.5 for half life value 
-        (results_df['Half_Life'] >= min_half_life) &
-        (results_df['Half_Life'] <= max_half_life)
-    ]
+    mask = (
+        (stats['Correlation'] >= correlation_threshold) &
+        (stats['Cointegration_PValue'] <= cointegration_pvalue_threshold) &
+        (stats['Spread_STD'] <= spread_std_threshold) &
+        (average_hurst < 0.5) &                       #  criterion for Hurst Exponent 0.5 for half life value
+        (stats['Half_Life'] >= min_half_life) &
+        (stats['Half_Life'] <= max_half_life)
+    )
+    selected_pairs = pair_results_frame(etf_names, pair_i[mask], pair_j[mask],
+                                        {name: values[mask] for name, values in stats.items()},
+                                        hurst[mask], discrete_lags)
 
     if selected_pairs.empty:
         print("No pairs met the selection criteria.")
@@ -1,45 +1,38 @@
 import numpy as np
 import pandas as pd
-from itertools import combinations
-from sklearn.decomposition import PCA
 from sklearn.cluster import OPTICS
-from utils import calculate_pair_statistics
-from utils import calculate_hurst_exponent 
+from utils import pair_results_frame
 
-def select_pairs_optics_clustering(formation_data, formation_start_date, formation_end_date,
+def select_pairs_optics_clustering(feature_cache, formation_start_date, formation_end_date,
                                    trading_start_date, trading_end_date, trading_period_days):
-    adj_close_cols = [col for col in formation_data.columns if 'adj_close' in col]
-    etf_names = sorted(list(set([col.split('_')[0] for col in adj_close_cols])))
-    if not adj_close_cols:
+    etf_names = feature_cache.etf_names
+    if not etf_names:
         print("No 'Adj_Close' columns found in the formation data.")
         return pd.DataFrame()
 
-    adj_close_df = formation_data[adj_close_cols].copy()
-    adj_close_df.columns = etf_names
-    returns_df = adj_close_df.pct_change().dropna()
-    if returns_df.empty:
+    if feature_cache.returns.shape[0] == 0:
         return pd.DataFrame()
 
-    returns_mean = returns_df.mean()
-    returns_std = returns_df.std().replace(0, 1)
-    returns_df_standardized = (returns_df - returns_mean) / returns_std
-
-    pca = PCA(n_components=10, random_state=42)
-    try:
-        principal_components = pca.fit_transform(returns_df_standardized.T)
-    except ValueError as e:
-        print(f"PCA failed: {e}")
+    # PCA through the N x N Gram matrix of the ETFs: eigh on N x N is far cheaper than a PCA over T features
+    n_components = 10
+    returns_df_standardized = feature_cache.Xc.T.astype(np.float32)
+    if returns_df_standardized.shape[0] < n_components:
+        print(f"PCA failed: {n_components} components requested for {returns_df_standardized.shape[0]} ETFs")
         return pd.DataFrame()
+    centered = returns_df_standardized - returns_df_standardized.mean(axis=0)
+    eigenvalues, eigenvectors = np.linalg.eigh((centered @ centered.T).astype(np.float64))
+
+    # Top components are at the end of eigh's ascending order; scores are U * S as in PCA.fit_transform
+    eigenvalues = np.clip(eigenvalues[::-1][:n_components], 0, None)
+    principal_components = eigenvectors[:, ::-1][:, :n_components] * np.sqrt(eigenvalues)
 
     principal_df = pd.DataFrame(data=principal_components, index=etf_names,
                                 columns=[f'PC{i+1}' for i in range(principal_components.shape[1])])
 
-    optics_model = OPTICS(min_samples=2, xi=0.05, min_cluster_size=0.1)
+    optics_model = OPTICS(min_samples=2, xi=0.05, min_cluster_size=0.1, metric='euclidean', algorithm='ball_tree')
     optics_model.fit(principal_df)
     labels = optics_model.labels_
 
-    features_df = pd.DataFrame(index=etf_names)
-    features_df['Cluster'] = labels
     unique_labels = set(labels)
     unique_labels.discard(-1)
     clusters = sorted(unique_labels)
@@ -47,66 +40,58 @@ def select_pairs_optics_clustering(formation_data, formation_start_date, formati
         print("No clusters found using OPTICS.")
         return pd.DataFrame()
 
-    pair_results = []
     discrete_lags = [20, 50, 100, 200]  # Define lags for Hurst computation
 
+    # Pairs within each cluster as index arrays into the price matrix; OPTICS labels are in
+    # etf_names order, so a member's position is already its row/column in the correlation matrix
+    pair_i, pair_j, pair_cluster = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)]
     for cluster_label in clusters:
-        etfs_in_cluster = features_df[features_df['Cluster'] == cluster_label].index.tolist()
-        if len(etfs_in_cluster) < 2:
-            continue
-
-        pairs = list(combinations(etfs_in_cluster, 2))
-
-        for pair in pairs:
-            etf1, etf2 = pair
-            series1 = adj_close_df[etf1]
-            series2 = adj_close_df[etf2]
-
-            stats = calculate_pair_statistics(series1, series2)
-            if stats:
-                spread = series1 - series2
-                hurst_results = calculate_hurst_exponent(spread.values, discrete_lags)
-
-                if isinstance(hurst_results, dict):
-                    stats['Hurst_Exponent'] = hurst_results
-                    stats['Average_Hurst'] = np.mean(list(hurst_results.values()))
-                else:
-                    stats['Hurst_Exponent'] = np.nan
-                    stats['Average_Hurst'] = np.nan
-
-                stats['Cluster'] = cluster_label  # Add Cluster information
-                pair_results.append(stats)
-
-    if not pair_results:
+        members = np.flatnonzero(labels == cluster_label)
+        a, b = np.triu_indices(len(members), 1)
+        pair_i.append(members[a])
+        pair_j.append(members[b])
+        pair_cluster.append(np.full(len(a), cluster_label, dtype=np.int64))  # Add Cluster information
+
+    pair_i = np.concatenate(pair_i)
+    pair_j = np.concatenate(pair_j)
+    pair_cluster = np.concatenate(pair_cluster)
+    if not len(pair_i):
         print("No pair statistics were calculated.")
         return pd.DataFrame()
 
-    results_df = pd.DataFrame(pair_results)
-
-    if 'Correlation' in results_df.columns:
-        results_df = results_df.dropna(subset=['Correlation'])
-    else:
+    # Correlation and spread std of every pair come straight from the price/return matrices
+    correlations = feature_cache.C[pair_i, pair_j]
+    spread_stds = feature_cache.spread_std(pair_i, pair_j)
+    non_stationary = feature_cache.non_stationary
+    valid = non_stationary[pair_i] & non_stationary[pair_j] & ~np.isnan(correlations)
+    if not valid.any():
         print("No valid pairs found with calculated Correlation.")
         return pd.DataFrame()
 
-    selected_pairs = pd.DataFrame()
-    for cluster_label in clusters:
-        cluster_pairs = results_df[results_df['Cluster'] == cluster_label]
-        if cluster_pairs.empty:
-            continue
-        spread_std_threshold = cluster_pairs['Spread_STD'].median()
-
-        filtered_pairs = cluster_pairs[
-            (cluster_pairs['Correlation'] >= 0.8) &
-            (cluster_pairs['Cointegration_PValue'] <= 0.05) &
-            (cluster_pairs['Average_Hurst'] < 0.5) &
-            (cluster_pairs['Half_Life'] >= 5) &
-            (cluster_pairs['Half_Life'] <= trading_period_days) &
-            (cluster_pairs['Spread_STD'] <= spread_std_threshold)
-        ]
-
-        if not filtered_pairs.empty:
-            selected_pairs = pd.concat([selected_pairs, filtered_pairs], ignore_index=True)
+    # Spread std threshold is the median over all valid pairs of the group
+    spread_std_threshold = pd.Series(spread_stds).where(valid).groupby(pair_cluster).transform('median').to_numpy()
+
+    # Only pairs passing the correlation filter go through cointegration and Hurst
+    survivors = np.flatnonzero(valid & (correlations >= 0.8))
+    pair_i, pair_j, pair_cluster = pair_i[survivors], pair_j[survivors], pair_cluster[survivors]
+    spread_std_threshold = spread_std_threshold[survivors]
+    stats = feature_cache.pair_statistics(pair_i, pair_j)
+    hurst = feature_cache.hurst_matrix(pair_i, pair_j, discrete_lags)
+    average_hurst = np.nanmean(hurst, axis=1) if len(hurst) else np.empty(0)
+
+    mask = (
+        (stats['Correlation'] >= 0.8) &
+        (stats['Cointegration_PValue'] <= 0.05) &
+        (average_hurst < 0.5) &
+        (stats['Half_Life'] >= 5) &
+        (stats['Half_Life'] <= trading_period_days) &
+        (stats['Spread_STD'] <= spread_std_threshold)
+    )
+
+    selected_pairs = pair_results_frame(feature_cache.etf_names, pair_i[mask], pair_j[mask],
+                                        {name: values[mask] for name, values in stats.items()},
+                                        hurst[mask], discrete_lags)
+    selected_pairs['Cluster'] = pair_cluster[mask]
 
     if selected_pairs.empty:
         print("No pairs met the selection criteria.")
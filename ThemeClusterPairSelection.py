@@ -1,7 +1,5 @@
 import pandas as pd
-from itertools import combinations
-from utils import calculate_pair_statistics
-from utils import calculate_hurst_exponent
+from utils import pair_results_frame
 import numpy as np
 
 # """
@@ -94,66 +92,58 @@ import numpy as np
 #     selected_pairs = selected_pairs[columns_order]
 
 #     return selected_pairs
-def select_pairs_theme_clustering(formation_data, formation_start_date, formation_end_date,
+def select_pairs_theme_clustering(feature_cache, formation_start_date, formation_end_date,
                                   trading_start_date, trading_end_date, trading_period_days):
-    adj_close_cols = [col for col in formation_data.columns if 'adj_close' in col]
-    etf_names = list(set([col.split('_')[0] for col in adj_close_cols]))
-    adj_close_df = formation_data[adj_close_cols]
-    adj_close_df.columns = etf_names
-
     etf_info = pd.read_csv('energy_etf_descriptions.csv')
     categories = etf_info['Segment'].unique()
-    pair_results = []
     discrete_lags = [20, 50, 100, 200]
 
+    # Pairs within each category as index arrays into the price matrix
+    pair_i, pair_j, pair_segment = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=object)]
     for category in categories:
         etfs_in_category = etf_info[etf_info['Segment'] == category]['Ticker'].tolist()
-        pairs = list(combinations(etfs_in_category, 2))
-        for pair in pairs:
-            etf1, etf2 = pair
-            if etf1 not in adj_close_df.columns or etf2 not in adj_close_df.columns:
-                continue
-
-            stats = calculate_pair_statistics(adj_close_df[etf1], adj_close_df[etf2])
-            if stats:
-                spread = adj_close_df[etf1] - adj_close_df[etf2]
-                hurst_results = calculate_hurst_exponent(spread.values, discrete_lags)
-
-                if isinstance(hurst_results, dict):
-                    stats['Hurst_Exponent'] = hurst_results
-                    stats['Average_Hurst'] = np.mean(list(hurst_results.values()))
-                else:
-                    stats['Hurst_Exponent'] = np.nan
-                    stats['Average_Hurst'] = np.nan
-
-                stats['Segment'] = category
-                pair_results.append(stats)
-
-    results_df = pd.DataFrame(pair_results)
-
-    if 'Correlation' in results_df.columns:
-        results_df = results_df.dropna(subset=['Correlation'])
-    else:
+        member_idx = np.array([feature_cache.etf_idx[etf] for etf in etfs_in_category if etf in feature_cache.etf_idx],
+                              dtype=np.int64)
+        a, b = np.triu_indices(len(member_idx), 1)
+        pair_i.append(member_idx[a])
+        pair_j.append(member_idx[b])
+        pair_segment.append(np.full(len(a), category, dtype=object))
+
+    pair_i = np.concatenate(pair_i)
+    pair_j = np.concatenate(pair_j)
+    pair_segment = np.concatenate(pair_segment)
+    # Correlation and spread std of every pair come straight from the price/return matrices
+    correlations = feature_cache.C[pair_i, pair_j]
+    spread_stds = feature_cache.spread_std(pair_i, pair_j)
+    non_stationary = feature_cache.non_stationary
+    valid = non_stationary[pair_i] & non_stationary[pair_j] & ~np.isnan(correlations)
+    if not valid.any():
         print("No valid pairs found with calculated Correlation.")
         return pd.DataFrame()
 
-    selected_pairs = pd.DataFrame()
-    for category in categories:
-        category_pairs = results_df[results_df['Segment'] == category]
-        if category_pairs.empty:
-            continue
-        spread_std_threshold = category_pairs['Spread_STD'].median()
-
-        filtered_pairs = category_pairs[
-            (category_pairs['Correlation'] >= 0.8) &
-            (category_pairs['Cointegration_PValue'] <= 0.05) &
-            (category_pairs['Average_Hurst'] < 0.5) &  # Filtering by Average_Hurst
-            (category_pairs['Half_Life'] >= 5) &
-            (category_pairs['Half_Life'] <= trading_period_days) &
-            (category_pairs['Spread_STD'] <= spread_std_threshold)
-        ]
-
-        selected_pairs = pd.concat([selected_pairs, filtered_pairs], ignore_index=True)
+    # Spread std threshold is the median over all valid pairs of the group
+    spread_std_threshold = pd.Series(spread_stds).where(valid).groupby(pair_segment).transform('median').to_numpy()
+
+    # Only pairs passing the correlation filter go through cointegration and Hurst
+    survivors = np.flatnonzero(valid & (correlations >= 0.8))
+    pair_i, pair_j, pair_segment = pair_i[survivors], pair_j[survivors], pair_segment[survivors]
+    spread_std_threshold = spread_std_threshold[survivors]
+    stats = feature_cache.pair_statistics(pair_i, pair_j)
+    hurst = feature_cache.hurst_matrix(pair_i, pair_j, discrete_lags)
+    average_hurst = np.nanmean(hurst, axis=1) if len(hurst) else np.empty(0)
+
+    mask = (
+        (stats['Correlation'] >= 0.8) &
+        (stats['Cointegration_PValue'] <= 0.05) &
+        (average_hurst < 0.5) &  # Filtering by Average_Hurst
+        (stats['Half_Life'] >= 5) &
+        (stats['Half_Life'] <= trading_period_days) &
+        (stats['Spread_STD'] <= spread_std_threshold)
+    )
+
+    selected_pairs = pair_results_frame(feature_cache.etf_names, pair_i[mask], pair_j[mask],
+                                        {name: values[mask] for name, values in stats.items()},
+                                        hurst[mask], discrete_lags)
 
     if selected_pairs.empty:
         print("No pairs met the selection criteria.")
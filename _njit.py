@@ -0,0 +1,9 @@
+# Numba is optional: without it the @njit kernels run as plain Python (same results, just slower)
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        # Supports both @njit and @njit(cache=True, ...)
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
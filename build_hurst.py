@@ -0,0 +1,22 @@
+# Ahead-of-time build of the Hurst kernel: python build_hurst.py writes the _hurst_ext extension
+# next to this file, so the pair selectors (and every joblib worker) skip the JIT warm-up.
+# utils falls back to the @njit kernel in hurst_numba when the extension has not been built, or was
+# built from another version of hurst_numba.py (checked against the _hurst_ext.sha1 written here).
+import os
+import hashlib
+from numba.pycc import CC
+from hurst_numba import hurst_kernel
+
+cc = CC('_hurst_ext')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Same source as the jitted kernel, compiled for contiguous float64 series and int64 lags
+cc.export('hurst_kernel', 'f8[::1](f8[::1], i8[::1])')(hurst_kernel.py_func)
+
+if __name__ == "__main__":
+    cc.compile()
+    # Record which kernel source the extension was built from
+    with open(os.path.join(cc.output_dir, 'hurst_numba.py'), 'rb') as f:
+        source_hash = hashlib.sha1(f.read()).hexdigest()
+    with open(os.path.join(cc.output_dir, '_hurst_ext.sha1'), 'w') as f:
+        f.write(source_hash + '\n')
@@ -1,32 +1,34 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 import os
+from utils import load_data
 os.makedirs("plots", exist_ok=True)
 
 # Load data
-pairs = pd.read_csv("all_selected_pairs.csv")
-prices = pd.read_csv("preprocessed_etfs.csv", index_col=0, parse_dates=True)
+pairs = pd.read_parquet("all_selected_pairs.parquet", columns=['etf1', 'etf2', 'Cluster'])
+prices = load_data("preprocessed_etfs.csv")
+
+# Only OPTICS rows carry a cluster
+pairs = pairs.dropna(subset=['Cluster'])
+
+# Normalize to 1.0 for visual comparison, once per ticker rather than once per pair appearance
+tickers = pd.unique(pairs[['etf1', 'etf2']].to_numpy().ravel())
+normalized = {t: prices[f"{t}_adj_close"] / prices[f"{t}_adj_close"].iloc[0] for t in tickers}
 
 # Group by cluster to see how the OPTICS algorithm actually behaved
+# One figure for all clusters, cleared between them
+fig, ax = plt.subplots(figsize=(12, 7))
 for cluster, group in pairs.groupby('Cluster'):
-    plt.figure(figsize=(12, 7))
+    ax.cla()
     
-    for _, row in group.iterrows():
-        # parse string
-        p_text = row['Pair'].replace("(", "").replace(")", "").replace("'", "")
-        t1, t2 = [t.strip() for t in p_text.split(',')]
-        
-        # Normalize to 1.0 for visual comparison
-        p1 = prices[f"{t1}_adj_close"] / prices[f"{t1}_adj_close"].iloc[0]
-        p2 = prices[f"{t2}_adj_close"] / prices[f"{t2}_adj_close"].iloc[0]
-        
-        plt.plot(p1, alpha=0.6, label=t1)
-        plt.plot(p2, alpha=0.6, label=t2)
+    for t1, t2 in zip(group['etf1'], group['etf2']):
+        ax.plot(normalized[t1], alpha=0.6, label=t1)
+        ax.plot(normalized[t2], alpha=0.6, label=t2)
     
-    plt.title(f"Cluster {cluster}: Convergence Check")
-    plt.legend(ncol=2, fontsize='small') # note: clusters can have many lines
-    plt.grid(alpha=0.3)
-    plt.savefig(f"plots/cluster_{cluster}_check.png")
-    plt.close()
+    ax.set_title(f"Cluster {cluster}: Convergence Check")
+    ax.legend(ncol=2, fontsize='small') # note: clusters can have many lines
+    ax.grid(alpha=0.3)
+    fig.savefig(f"plots/cluster_{cluster}_check.png", dpi=80)
+plt.close(fig)
 
 print("Cluster plots generated.")
@@ -4,24 +4,19 @@ import pandas as pd
 tickers_df = pd.read_csv('energy_etf_descriptions.csv')
 tickers = tickers_df['Ticker'].tolist()
 
-# start and end dates 
+# start and end dates
 start_date = '2015-01-01'
 end_date = '2024-11-30'
-combined_data = pd.DataFrame()
 
+# One bulk request for all tickers, fetched on concurrent threads by yfinance
+ohlcv_data = yf.download(tickers=" ".join(tickers), start=start_date, end=end_date, interval='1d',
+                         group_by='ticker', threads=True, auto_adjust=False)
 
-for ticker in tickers:
-    ohlcv_data = yf.download(ticker, start=start_date, end=end_date, interval='1d')
-    ohlcv_data = ohlcv_data.rename(columns={
-        'Open': f'{ticker}_open',
-        'High': f'{ticker}_high',
-        'Low': f'{ticker}_low',
-        'Adj Close': f'{ticker}_adj_close',
-        'Volume': f'{ticker}_volume'
-    })
-    ohlcv_data = ohlcv_data.drop(columns=['Close'])
-    if combined_data.empty:
-        combined_data = ohlcv_data
-    else:
-        combined_data = combined_data.join(ohlcv_data, how='outer')
-combined_data.to_csv('Energy_ETF_price_data.csv')
\ No newline at end of file
+# Flatten (ticker, field) columns to the {ticker}_{field} schema, e.g. XLE_adj_close
+fields = ['Open', 'High', 'Low', 'Adj Close', 'Volume']
+combined_data = ohlcv_data.reindex(columns=pd.MultiIndex.from_product([tickers, fields]))
+combined_data.columns = [f"{ticker}_{field.lower().replace(' ', '_')}" for ticker, field in combined_data.columns]
+combined_data.index.name = 'Date'
+
+combined_data.to_csv('Energy_ETF_price_data.csv')
+combined_data.to_parquet('Energy_ETF_price_data.parquet') # typed copy, much faster to reload than the CSV
@@ -2,10 +2,11 @@ import pandas as pd
 
 def filter_best_pairs(selected_pairs_file):
     # Load the selected pairs DataFrame
-    selected_pairs_df = pd.read_csv(selected_pairs_file)
+    selected_pairs_df = pd.read_parquet(selected_pairs_file)
 
-    # Standardize the Pair column to have consistent formatting
-    selected_pairs_df['Pair'] = selected_pairs_df['Pair'].apply(lambda x: '-'.join(sorted(x.replace("(", "").replace(")", "").replace("'", "").split(','))))
+    # Standardize the Pair column to have consistent formatting (legs in alphabetical order)
+    etf1, etf2 = selected_pairs_df['etf1'], selected_pairs_df['etf2']
+    selected_pairs_df['Pair'] = (etf1 + '-' + etf2).where(etf1 <= etf2, etf2 + '-' + etf1)
 
     # Define selection criteria for the best pairs
     correlation_threshold = 0.9
@@ -19,7 +20,7 @@ def filter_best_pairs(selected_pairs_file):
         (
             (selected_pairs_df['Correlation'] >= correlation_threshold) &
             (selected_pairs_df['Cointegration_PValue'] <= cointegration_pvalue_threshold) &
-            (selected_pairs_df['Hurst_Exponent'] < hurst_exponent_threshold) &
+            (selected_pairs_df['Average_Hurst'] < hurst_exponent_threshold) &
             (selected_pairs_df['Half_Life'] >= min_half_life) &
             (selected_pairs_df['Half_Life'] <= max_half_life) 
         )
@@ -32,5 +33,5 @@ def filter_best_pairs(selected_pairs_file):
 
 # Example usage
 if __name__ == "__main__":
-    filtered_pairs = filter_best_pairs('all_selected_pairs.csv')
+    filtered_pairs = filter_best_pairs('all_selected_pairs.parquet')
     print("Filtered pairs saved to 'filtered_best_pairs.csv'")
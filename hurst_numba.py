@@ -0,0 +1,42 @@
+import numpy as np
+from _njit import njit
+
+# Hurst exponent kernel
+@njit(cache=True, nogil=True)
+def hurst_kernel(p, lags):
+    """
+    Compute the Hurst exponent of a time series for each lag.
+
+    Input:
+        p (np.ndarray): Contiguous float64 series (e.g. the spread of a pair).
+        lags (np.ndarray): int64 lags.
+
+    Returns:
+        np.ndarray: Hurst exponent per lag, NaN where the lag is too long for the series.
+    """
+    n = p.shape[0]
+    out = np.empty(lags.shape[0])
+
+    # Prefix sums, so the mean lagged diff of every lag is O(1): sum(p[lag:]) - sum(p[:n-lag])
+    csum = np.empty(n + 1)
+    csum[0] = 0.0
+    for i in range(n):
+        csum[i + 1] = csum[i] + p[i]
+
+    for li in range(lags.shape[0]):
+        lag = lags[li]
+        if lag >= n:
+            out[li] = np.nan
+            continue
+
+        # Variance of the lagged price diff without allocating the diff array
+        m = n - lag
+        mean = ((csum[n] - csum[lag]) - csum[m]) / m
+        ss = 0.0
+        for i in range(lag, n):
+            d = p[i] - p[i - lag] - mean
+            ss += d * d
+
+        # log-log slope, divided by 2
+        out[li] = np.log10(ss / m) / np.log10(lag) / 2
+    return out
@@ -4,7 +4,9 @@ from datetime import timedelta
 import matplotlib.pyplot as plt
 import os
 from sklearn.manifold import TSNE
-from utils import load_data, calculate_pair_statistics
+from joblib import Parallel, delayed
+import pyarrow as pa
+from utils import load_data, PairFeatureCache
 from NoClusterPairSelection import select_pairs_no_clustering
 from ThemeClusterPairSelection import select_pairs_theme_clustering
 from OpticsPairSelection import select_pairs_optics_clustering
@@ -20,11 +22,10 @@ def getEmbargoTimes(times, pctEmbargo):
         mbrg = pd.concat([mbrg, pd.Series(times[-1], index=times[-step:])])
     return mbrg
 
-# Function to plot Hurst Exponent, Cointegration, Correlation, PCA, and OPTICS
+# Function to plot Hurst Exponent, Cointegration, Correlation, PCA, and OPTICS reachability
 def plot_results(results_df, pca_data, optics_model, pca_components):
     # Create directory for saving plots
     os.makedirs("SelectedPairsRelationalPlots", exist_ok=True)
-    os.makedirs("Optics_Plots", exist_ok=True)
 
     # Plot Hurst Exponent
     plt.figure(figsize=(10, 6))
@@ -80,8 +81,13 @@ def plot_results(results_df, pca_data, optics_model, pca_components):
     plt.savefig("SelectedPairsRelationalPlots/optics_reachability_plot.png")
     plt.close()
 
+
+# Function to plot the t-SNE embedding of the OPTICS clusters (O(N^2), so not run for every window by default)
+def plot_tsne(pca_data, optics_model):
+    os.makedirs("Optics_Plots", exist_ok=True)
+
     # t-SNE Plot
-    tsne = TSNE(n_components=2, random_state=42)
+    tsne = TSNE(n_components=2, method='barnes_hut', n_jobs=-1, random_state=42)
     tsne_data = tsne.fit_transform(pca_data)
     plt.figure(figsize=(10, 6))
     plt.scatter(tsne_data[:, 0], tsne_data[:, 1], alpha=0.6, c=optics_model.labels_, cmap='tab10')
@@ -93,7 +99,67 @@ def plot_results(results_df, pca_data, optics_model, pca_components):
     plt.close()
 
 
-def main():
+# Function to save the selected pairs as typed, compressed Parquet
+def save_selected_pairs(selected_pairs, file_path):
+    """
+    Write the selected pairs to Parquet (zstd). The Pair tuple is stored as etf1/etf2 columns,
+    Method as a categorical, Cluster as a nullable integer and Hurst_Exponent as a lag -> value map.
+
+    Input:
+        selected_pairs (pd.DataFrame): Concatenated selector outputs.
+        file_path (str): Output path.
+    """
+    selected_pairs = selected_pairs.copy()
+    if 'Pair' in selected_pairs:
+        legs = pd.DataFrame(selected_pairs.pop('Pair').tolist(), index=selected_pairs.index, columns=['etf1', 'etf2'])
+        selected_pairs = pd.concat([legs, selected_pairs], axis=1)
+    if 'Method' in selected_pairs:
+        selected_pairs['Method'] = selected_pairs['Method'].astype('category')
+    if 'Cluster' in selected_pairs:
+        # pyarrow reads numeric categoricals back as plain numbers, so Cluster stays an integer label
+        selected_pairs['Cluster'] = selected_pairs['Cluster'].astype('Int64')
+
+    # Hurst dicts have int keys, which pyarrow can't infer, so give the column an explicit map type
+    schema = None
+    if 'Hurst_Exponent' in selected_pairs:
+        position = selected_pairs.columns.get_loc('Hurst_Exponent')
+        schema = pa.Schema.from_pandas(selected_pairs.drop(columns='Hurst_Exponent'), preserve_index=False)
+        schema = schema.insert(position, pa.field('Hurst_Exponent', pa.map_(pa.int64(), pa.float64())))
+
+    selected_pairs.to_parquet(file_path, index=False, compression='zstd', schema=schema)
+
+
+# Function to run the three pair selectors on one rolling window
+def process_window(formation_data, formation_start_date, formation_end_date,
+                   trading_start_date, trading_end_date):
+    # Calculate trading_period_days (update in case of leap years)
+    actual_trading_period_days = (trading_end_date - trading_start_date).days
+    print(f"Processing period: {formation_start_date.date()} to {trading_end_date.date()}")
+
+    # Price/return matrices shared by the three selectors
+    feature_cache = PairFeatureCache(formation_data)
+
+    # No Clustering
+    selected_pairs_no_cluster = select_pairs_no_clustering(
+        feature_cache, formation_start_date, formation_end_date,
+        trading_start_date, trading_end_date, actual_trading_period_days)
+
+    # Theme Clustering
+    selected_pairs_theme_cluster = select_pairs_theme_clustering(
+        feature_cache, formation_start_date, formation_end_date,
+        trading_start_date, trading_end_date, actual_trading_period_days
+    )
+
+    # OPTICS Clustering
+    selected_pairs_optics_cluster = select_pairs_optics_clustering(
+        feature_cache, formation_start_date, formation_end_date,
+        trading_start_date, trading_end_date, actual_trading_period_days
+    )
+
+    return selected_pairs_no_cluster, selected_pairs_theme_cluster, selected_pairs_optics_cluster
+
+
+def main(n_jobs=-1, plot_every_window=False):
     preprocessed_data_file = 'preprocessed_etfs.csv'
     df = load_data(preprocessed_data_file)
 
@@ -117,46 +183,16 @@ def main():
     trading_start_date = formation_end_date
     trading_end_date = trading_start_date + trading_period
 
-    # Initialize DataFrame
-    all_selected_pairs = pd.DataFrame()
-
+    # Materialize the rolling windows first, each one is independent
+    windows = []
     while trading_end_date <= data_end_date:
         # Extract data for the periods
         formation_data = df[formation_start_date:formation_end_date]
         validation_start_date = formation_end_date - validation_period
         validation_data = df[validation_start_date:formation_end_date]
         trading_data = df[trading_start_date:trading_end_date]
-
-        # Calculate trading_period_days (update in case of leap years)
-        actual_trading_period_days = (trading_end_date - trading_start_date).days
-        print(f"Processing period: {formation_start_date.date()} to {trading_end_date.date()}")
-
-        # Embargo times
-        embargo_times = getEmbargoTimes(df.index, pct_embargo)
-
-        # No Clustering
-        selected_pairs_no_cluster = select_pairs_no_clustering(
-            formation_data, formation_start_date, formation_end_date,
-            trading_start_date, trading_end_date, actual_trading_period_days)
-        all_selected_pairs = pd.concat([all_selected_pairs, selected_pairs_no_cluster], ignore_index=True)
-
-        # Theme Clustering
-        selected_pairs_theme_cluster = select_pairs_theme_clustering(
-            formation_data, formation_start_date, formation_end_date,
-            trading_start_date, trading_end_date, actual_trading_period_days
-        )
-        all_selected_pairs = pd.concat([all_selected_pairs, selected_pairs_theme_cluster], ignore_index=True)
-
-        # OPTICS Clustering
-        selected_pairs_optics_cluster = select_pairs_optics_clustering(
-            formation_data, formation_start_date, formation_end_date,
-            trading_start_date, trading_end_date, actual_trading_period_days
-        )
-        if isinstance(selected_pairs_optics_cluster, tuple):
-            selected_pairs_optics_cluster, pca_data, optics_model = selected_pairs_optics_cluster
-            # Plotting results for the current iteration
-            plot_results(all_selected_pairs, pca_data, optics_model, pca_components=3)
-        all_selected_pairs = pd.concat([all_selected_pairs, selected_pairs_optics_cluster], ignore_index=True)
+        windows.append((formation_data, formation_start_date, formation_end_date,
+                        trading_start_date, trading_end_date))
 
         # Advance the windows
         formation_start_date += step_size
@@ -164,8 +200,40 @@ def main():
         trading_start_date += step_size
         trading_end_date += step_size
 
+    # Embargo times
+    embargo_times = getEmbargoTimes(df.index, pct_embargo)
+
+    # Windows run in worker processes; each worker only receives its formation slice, not the full panel
+    window_results = Parallel(n_jobs=n_jobs, backend='loky')(
+        delayed(process_window)(*window) for window in windows
+    )
+
+    # Collect the selected pairs and concatenate once at the end
+    parts = []
+    last_optics_plot = None
+
+    for selected_pairs_no_cluster, selected_pairs_theme_cluster, selected_pairs_optics_cluster in window_results:
+        parts.append(selected_pairs_no_cluster)
+        parts.append(selected_pairs_theme_cluster)
+        # Only taken if the OPTICS selector returns (pairs, pca_data, optics_model); it currently returns
+        # the pairs DataFrame alone, so plot_results/plot_tsne do not run
+        if isinstance(selected_pairs_optics_cluster, tuple):
+            selected_pairs_optics_cluster, pca_data, optics_model = selected_pairs_optics_cluster
+            if plot_every_window:
+                plot_tsne(pca_data, optics_model)
+            last_optics_plot = (pca_data, optics_model)
+        parts.append(selected_pairs_optics_cluster)
+
+    all_selected_pairs = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+
+    # The plots are overwritten every window, so they are drawn once from the full frame and the final window
+    if last_optics_plot is not None:
+        plot_results(all_selected_pairs, *last_optics_plot, pca_components=3)
+        if not plot_every_window:
+            plot_tsne(*last_optics_plot)
+
     # Save 
-    all_selected_pairs.to_csv('all_selected_pairs.csv', index=False)
+    save_selected_pairs(all_selected_pairs, 'all_selected_pairs.parquet')
 
 if __name__ == "__main__":
     main()
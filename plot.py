@@ -1,56 +1,109 @@
 import os
+import numpy as np
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg") # file output only; safe in the joblib worker processes
 import matplotlib.pyplot as plt
 import seaborn as sns
-from statsmodels.tsa.stattools import adfuller
+from collections import namedtuple
+from joblib import Parallel, delayed, effective_n_jobs
 
-# Set up output
-out_dir = "plots"
-os.makedirs(out_dir, exist_ok=True)
+PairSeries = namedtuple('PairSeries', ['etf1', 'etf2', 's1', 's2', 'spread'])
 
-# Data loading
-pairs = pd.read_csv("all_selected_pairs.csv")
-prices = pd.read_csv("preprocessed_etfs.csv", index_col=0, parse_dates=True)
+# Price legs and spread of each selected pair, as arrays
+def _build_pair_cache(selected_pairs, prices):
+    cache = []
+    for t1, t2 in zip(selected_pairs['etf1'], selected_pairs['etf2']):
+        s1 = prices[f"{t1}_adj_close"].to_numpy()
+        s2 = prices[f"{t2}_adj_close"].to_numpy()
+        cache.append(PairSeries(t1, t2, s1, s2, s1 - s2))
+    return cache
+
+# Price convergence and spread stationarity plots of a chunk of pairs; the two figures are
+# allocated once per chunk and cleared between pairs
+def _render_pairs(pairs_chunk, dates, out_dir):
+    # statsmodels is only needed here, keep it out of the import of this module
+    from statsmodels.tsa.stattools import adfuller
+
+    price_fig, price_ax = plt.subplots(figsize=(12, 5))
+    spread_fig, spread_ax = plt.subplots(figsize=(10, 4))
+    for pair in pairs_chunk:
+        # Normalized Plot (Visual Cointegration Check)
+        price_ax.cla()
+        price_ax.plot(dates, pair.s1 / pair.s1[0], label=pair.etf1, alpha=0.8)
+        price_ax.plot(dates, pair.s2 / pair.s2[0], label=pair.etf2, alpha=0.8)
+        price_ax.set_title(f"Price Convergence: {pair.etf1} vs {pair.etf2}")
+        price_ax.legend()
+        price_fig.savefig(f"{out_dir}/price_{pair.etf1}_{pair.etf2}.png", dpi=80)
+
+        # Spread Stationarity (ADF Check)
+        # p-value
+        adf_p = adfuller(np.diff(pair.spread))[1]
+        spread_ax.cla()
+        spread_ax.plot(dates, pair.spread)
+        spread_ax.set_title(f"Spread {pair.etf1}-{pair.etf2} (ADF p={adf_p:.4f})")
+        spread_ax.axhline(pair.spread.mean(), color='red', linestyle='--')
+        spread_fig.savefig(f"{out_dir}/spread_{pair.etf1}_{pair.etf2}.png", dpi=80)
+    plt.close(price_fig)
+    plt.close(spread_fig)
+
+# Pearson correlation of the columns as one float32 matrix product (plenty for a heatmap)
+def _fast_corr(df):
+    A = df.to_numpy(np.float32)
+    A = A - A.mean(0)
+    A /= (A.std(0) + 1e-12) # constant columns stay at zero instead of dividing by zero
+    return (A.T @ A) / A.shape[0]
 
 # Global Market Context
-plt.figure(figsize=(10, 8))
-sns.heatmap(prices.corr(), cmap="coolwarm", xticklabels=False, yticklabels=False)
-plt.title("Asset Correlation Matrix")
-plt.savefig(f"{out_dir}/market_corr.png")
+def plot_correlation_heatmap(prices, out_dir):
+    plt.figure(figsize=(10, 8))
+    # One SGEMM for the whole matrix instead of pandas' pairwise column loop (prices have no gaps after preprocessing)
+    price_corr = _fast_corr(prices)
+    # The matrix is symmetric, so only the lower triangle (with the unit diagonal) is drawn
+    upper_triangle = np.triu(np.ones(price_corr.shape, dtype=bool), k=1)
+    sns.heatmap(price_corr, mask=upper_triangle, cmap="coolwarm", xticklabels=False, yticklabels=False)
+    plt.title("Asset Correlation Matrix")
+    plt.savefig(f"{out_dir}/market_corr.png")
+    plt.close()
 
 # Pair Selection Stats (Histograms in one figure for quick review)
-fig, ax = plt.subplots(1, 3, figsize=(18, 5))
-sns.histplot(pairs['Average_Hurst'], kde=True, ax=ax[0], color='blue').set_title('Hurst Distribution')
-sns.histplot(pairs['Half_Life'], bins=20, ax=ax[1], color='green').set_title('Half-Life (Days)')
-sns.histplot(pairs['Cointegration_PValue'], bins=30, ax=ax[2], color='red').set_title('Coint P-Values')
-plt.tight_layout()
-plt.savefig(f"{out_dir}/selection_metrics.png")
+def plot_selection_metrics(pairs, out_dir):
+    fig, ax = plt.subplots(1, 3, figsize=(18, 5))
+    sns.histplot(pairs['Average_Hurst'], kde=True, ax=ax[0], color='blue').set_title('Hurst Distribution')
+    sns.histplot(pairs['Half_Life'], bins=20, ax=ax[1], color='green').set_title('Half-Life (Days)')
+    sns.histplot(pairs['Cointegration_PValue'], bins=30, ax=ax[2], color='red').set_title('Coint P-Values')
+    plt.tight_layout()
+    plt.savefig(f"{out_dir}/selection_metrics.png")
+    plt.close(fig)
 
 # Individual Pair Analysis (Focus on Spread Dynamics)
-# We only plot the top 5 pairs
-for _, row in pairs.head(5).iterrows():
-    p_text = row['Pair'].replace("(", "").replace(")", "").replace("'", "")
-    t1, t2 = [t.strip() for t in p_text.split(',')]
-    
-    # Calculate Spread
-    s1, s2 = prices[f"{t1}_adj_close"], prices[f"{t2}_adj_close"]
-    spread = s1 - s2
-    
-    # Normalized Plot (Visual Cointegration Check)
-    plt.figure(figsize=(12, 5))
-    plt.plot(s1/s1[0], label=t1, alpha=0.8)
-    plt.plot(s2/s2[0], label=t2, alpha=0.8)
-    plt.title(f"Price Convergence: {t1} vs {t2}")
-    plt.legend()
-    plt.savefig(f"{out_dir}/price_{t1}_{t2}.png")
-    
-    # Spread Stationarity (ADF Check)
-    # p-value
-    adf_p = adfuller(spread.diff().dropna())[1]
-    plt.figure(figsize=(10, 4))
-    spread.plot(title=f"Spread {t1}-{t2} (ADF p={adf_p:.4f})")
-    plt.axhline(spread.mean(), color='red', linestyle='--')
-    plt.savefig(f"{out_dir}/spread_{t1}_{t2}.png")
-    plt.close('all')
-
-print(f"Visualizations dumped to {out_dir}/")
+def plot_pairs(pairs, prices, out_dir, top_n=5):
+    # We only plot the top 5 pairs; legs and spread are extracted once and shared by both plots
+    pair_cache = _build_pair_cache(pairs.head(top_n), prices)
+
+    # Each pair's plots are independent, so they are rendered concurrently, one chunk of pairs per worker
+    n_chunks = max(min(effective_n_jobs(-1), len(pair_cache)), 1)
+    Parallel(n_jobs=n_chunks, backend="loky")(
+        delayed(_render_pairs)(pair_cache[k::n_chunks], prices.index, out_dir) for k in range(n_chunks)
+    )
+
+def main():
+    # utils pulls in statsmodels/numba, only needed when the script actually runs
+    from utils import load_data
+
+    # Set up output
+    out_dir = "plots"
+    os.makedirs(out_dir, exist_ok=True)
+
+    # Data loading
+    pairs = pd.read_parquet("all_selected_pairs.parquet")
+    prices = load_data("preprocessed_etfs.csv").astype(np.float32) # plots only, float32 halves the bytes moved
+
+    plot_correlation_heatmap(prices, out_dir)
+    plot_selection_metrics(pairs, out_dir)
+    plot_pairs(pairs, prices, out_dir)
+
+    print(f"Visualizations dumped to {out_dir}/")
+
+if __name__ == "__main__":
+    main()
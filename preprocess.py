@@ -1,35 +1,49 @@
 import pandas as pd
+import numpy as np
 import sys
+import os
 
 # Load raw energy data
-# Note: Using index_col=0 because the first column is always the date/timestamp
-df = pd.read_csv('Energy_ETF_price_data.csv', index_col=0, parse_dates=True)
-
-# Drop exact time duplicates - sometimes happens with vendor data merges
-df = df[~df.index.duplicated(keep='first')]
+# The Parquet copy written by datadownload.py is typed, so prefer it over parsing the CSV text
+if os.path.exists('Energy_ETF_price_data.parquet'):
+    df = pd.read_parquet('Energy_ETF_price_data.parquet')
+else:
+    # Note: the first column is always the date/timestamp
+    df = pd.read_csv('Energy_ETF_price_data.csv', engine='pyarrow')
+    df = df.set_index(df.columns[0])
+    df.index = pd.to_datetime(df.index)
 
 # Grabbing only the adj_close columns for the pairs model
+# (done first so the cleaning below only touches this block, not all five OHLCV fields)
 adj_cols = [c for c in df.columns if c.endswith('_adj_close')]
-data = df[adj_cols].copy()
+
+# Drop exact time duplicates - sometimes happens with vendor data merges
+data = df.loc[~df.index.duplicated(keep='first'), adj_cols]
 
 print(f"Starting with {len(data.columns)} tickers...")
 
 # Cleaning ---
 
+# Both checks come from one float64 array instead of per-column pandas reductions
+values = data.to_numpy(dtype=np.float64)
+
 # Drop tickers with any NaNs. 
 # NNs crash on nulls and ffill can introduce lookahead bias if not careful.
-bad_tickers = data.columns[data.isna().any()].tolist()
+has_gaps = np.isnan(values).any(axis=0)
+bad_tickers = data.columns[has_gaps].tolist()
 if bad_tickers:
     print(f"Dropping {len(bad_tickers)} tickers with gaps: {bad_tickers}")
-    data = data.drop(columns=bad_tickers)
 
-# Remove "Dead" tickers (constant price / zero variance)
-stale = data.columns[data.nunique() <= 1].tolist()
+# Remove "Dead" tickers (constant price / zero variance); max == min is exact, unlike std == 0
+is_stale = ~has_gaps & (np.ptp(values, axis=0) == 0)
+stale = data.columns[is_stale].tolist()
 if stale:
     print(f"Dropping {len(stale)} stale/dead tickers: {stale}")
-    data = data.drop(columns=stale)
+
+data = data.loc[:, ~(has_gaps | is_stale)]
 
 # Final check
 print(f"Cleaned dataset: {data.shape[1]} tickers remaining.")
 data.to_csv('preprocessed_etfs.csv')
-print("Done. Saved to preprocessed_etfs.csv")
+data.to_parquet('preprocessed_etfs.parquet') # typed copy, utils.load_data reads it when present
+print("Done. Saved to preprocessed_etfs.csv and preprocessed_etfs.parquet")
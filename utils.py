@@ -1,21 +1,65 @@
 import pandas as pd
 import numpy as np
-from scipy.stats import pearsonr, skew, kurtosis
-from statsmodels.tsa.stattools import coint, adfuller
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from joblib import Parallel, delayed
+from scipy.stats import skew, kurtosis
+from statsmodels.tsa.stattools import adfuller
+from statsmodels.tsa.adfvalues import mackinnonp
 from ta.momentum import RSIIndicator
 from ta.trend import SMAIndicator
 from statsmodels.regression.linear_model import OLS
 from statsmodels.tools.tools import add_constant
 import warnings
-from statsmodels.tsa.ar_model import AutoReg
+from _njit import njit
 
 warnings.filterwarnings("ignore")
 
+# Hurst kernel: the ahead-of-time build (see build_hurst.py) when it was built from the current
+# hurst_numba.py, the @njit kernel otherwise
+def _load_hurst_kernel():
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        with open(os.path.join(here, 'hurst_numba.py'), 'rb') as f:
+            source_hash = hashlib.sha1(f.read()).hexdigest()
+        with open(os.path.join(here, '_hurst_ext.sha1')) as f:
+            built_hash = f.read().strip()
+        if built_hash == source_hash:
+            from _hurst_ext import hurst_kernel
+            return hurst_kernel
+        print("⚠️ Warning: _hurst_ext was built from an older hurst_numba.py, using the @njit kernel. Rerun build_hurst.py.")
+    except (OSError, ImportError):
+        pass  # Not built
+    from hurst_numba import hurst_kernel
+    return hurst_kernel
+
+hurst_kernel = _load_hurst_kernel()
+
 def load_data(file_path):
-    df = pd.read_csv(file_path, parse_dates=['Date'])
-    df.set_index('Date', inplace=True)
+    # Prefer the typed Parquet copy written next to the CSV by preprocess.py, unless the CSV is newer
+    parquet_path = os.path.splitext(file_path)[0] + '.parquet'
+    if os.path.exists(parquet_path) and (not os.path.exists(file_path) or
+                                         os.path.getmtime(parquet_path) >= os.path.getmtime(file_path)):
+        df = pd.read_parquet(parquet_path)
+    else:
+        df = pd.read_csv(file_path, engine='pyarrow', parse_dates=['Date'])
+        df.set_index('Date', inplace=True)
     return df
 
+def parse_adj_close_columns(columns):
+    """
+    Find the adjusted close columns and their ETF names, e.g. 'XLE_adj_close' -> 'XLE'.
+
+    Returns:
+        tuple: (adj_close_cols, etf_names) lists, in column order.
+    """
+    columns = pd.Index(columns)
+    etf_names = columns.str.extract(r'^(.*?)_adj_close$')[0]
+    has_adj_close = etf_names.notna().to_numpy()
+    return columns[has_adj_close].tolist(), etf_names[has_adj_close].tolist()
+
 # Stationarity check
 def is_not_stationary(series, significance_level=0.05):
     """
@@ -44,35 +88,100 @@ def is_not_stationary(series, significance_level=0.05):
         print(f"Unexpected error during ADF test on '{series.name}': {e}")
         return True  # Treat unexpected errors as non-stationary
 
+# Cache key of a series: its name plus a digest of its values, so the same ETF in another
+# formation window (different values) is a different key
+def _series_key(series):
+    values = np.ascontiguousarray(series.to_numpy(dtype=np.float64))
+    return series.name, hashlib.sha1(values.tobytes()).hexdigest()
+
+# Bounded LRU memo shared by the result caches below; the lock keeps it safe for the threaded pair sweeps
+_cache_lock = threading.Lock()
+
+def _memoized(cache, maxsize, key, compute):
+    with _cache_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+    value = compute()
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > maxsize:
+            cache.popitem(last=False)  # Least recently used first
+    return value
+
+def clear_caches():
+    """
+    Empty the memoized ADF and Engle-Granger results, e.g. between parameter sweeps.
+    """
+    with _cache_lock:
+        _stationarity_cache.clear()
+        _cointegration_cache.clear()
+
+# ADF results by series content: the same ETF leg recurs in many pairs
+_STATIONARITY_CACHE_SIZE = 1024
+_stationarity_cache = OrderedDict()
+
+def is_not_stationary_cached(series, significance_level=0.05):
+    """
+    Memoized is_not_stationary, keyed on the series content.
+    """
+    key = (_series_key(series), significance_level)
+    return _memoized(_stationarity_cache, _STATIONARITY_CACHE_SIZE, key,
+                     lambda: is_not_stationary(series, significance_level))
+
+# Engle-Granger results by pair content
+_COINTEGRATION_CACHE_SIZE = 8192
+_cointegration_cache = OrderedDict()
+
 # Updated Engle-Granger test to handle constant series
-def egle_granger_test_bidirectional(series1, series2):
+def egle_granger_test_bidirectional(series1, series2, early_exit_pvalue=None):
     """
     Perform Engle-Granger test in both directions to check for cointegration.
     
     Input:
         series1 (pd.Series): First time series.
         series2 (pd.Series): Second time series.
+        early_exit_pvalue (float, optional): Skip the second direction when the first one's p-value is
+            already below this. The reported result is then the first direction's, not necessarily the best.
     
     Returns:
         dict: Contains t-statistics and p-value of the better cointegration result.
     """
+    # The full test is symmetric in the two legs, so (a, b) and (b, a) share one entry
+    legs = (_series_key(series1), _series_key(series2))
+    key = (frozenset(legs) if early_exit_pvalue is None else legs, early_exit_pvalue)
+    result = _memoized(_cointegration_cache, _COINTEGRATION_CACHE_SIZE, key,
+                       lambda: _egle_granger_test(series1, series2, early_exit_pvalue))
+    return dict(result)
+
+def _egle_granger_test(series1, series2, early_exit_pvalue):
     # Skip testing if either series is constant
     if series1.nunique() <= 1 or series2.nunique() <= 1:
         print(f"⚠️ Warning: One or both series are constant. Skipping Engle-Granger test.")
         return {'tstat': np.nan, 'pvalue': np.nan}
     
+    # Each direction goes through the closed-form OLS + batched ADF kernel of batch_cointegration_test,
+    # instead of statsmodels coint (an OLS fit plus an adfuller lag search refitting every lag)
+    values1 = series1.to_numpy(dtype=np.float64)[:, None]
+    values2 = series2.to_numpy(dtype=np.float64)[:, None]
+
     # Test 1: Series1 ~ Series2
     try:
-        test1 = coint(series1, series2)
-        tstat1, pvalue1 = test1[0], test1[1]
+        tstat1 = _batch_residual_adf(values1, values2)[0]
+        pvalue1 = mackinnonp(tstat1, regression='c', N=2) if not np.isnan(tstat1) else np.nan
     except ValueError as e:
         print(f" Error performing cointegration test on '{series1.name}' and '{series2.name}': {e}")
         tstat1, pvalue1 = np.nan, np.nan
+
+    # Strong enough in the first direction, don't run the second
+    if early_exit_pvalue is not None and pvalue1 < early_exit_pvalue:
+        return {'tstat': tstat1, 'pvalue': pvalue1}
     
     # Test 2: Series2 ~ Series1
     try:
-        test2 = coint(series2, series1)
-        tstat2, pvalue2 = test2[0], test2[1]
+        tstat2 = _batch_residual_adf(values2, values1)[0]
+        pvalue2 = mackinnonp(tstat2, regression='c', N=2) if not np.isnan(tstat2) else np.nan
     except ValueError as e:
         print(f" Error performing cointegration test on '{series2.name}' and '{series1.name}': {e}")
         tstat2, pvalue2 = np.nan, np.nan
@@ -83,47 +192,169 @@ def egle_granger_test_bidirectional(series1, series2):
     else:
         return {'tstat': tstat1, 'pvalue': pvalue1}
 
+# Batched Engle-Granger test for many pairs
+def batch_cointegration_test(X, idx_i, idx_j):
+    """
+    Perform the bidirectional Engle-Granger test for many pairs at once.
+
+    Same test as egle_granger_test_bidirectional (OLS with a constant, ADF on the residuals with
+    the lag picked by AIC, MacKinnon p-value), but each regression is solved for all pairs together
+    instead of one statsmodels call per pair, direction and lag.
+
+    Input:
+        X (np.ndarray): T x N price matrix.
+        idx_i (np.ndarray): Column of the first ETF of each pair.
+        idx_j (np.ndarray): Column of the second ETF of each pair.
+
+    Returns:
+        tuple: t-statistics and p-values (np.ndarray) of the better direction of each pair.
+    """
+    idx_i = np.asarray(idx_i, dtype=np.int64)
+    idx_j = np.asarray(idx_j, dtype=np.int64)
+    n_pairs = len(idx_i)
+    if n_pairs == 0:
+        return np.empty(0), np.empty(0)
+
+    # Series1 ~ Series2 and Series2 ~ Series1 in the same batch
+    y = X[:, np.concatenate([idx_i, idx_j])]
+    x = X[:, np.concatenate([idx_j, idx_i])]
+    tstats = np.empty(2 * n_pairs)
+    for start in range(0, 2 * n_pairs, 256): # bounds the memory of the lagged design matrices
+        chunk = slice(start, start + 256)
+        tstats[chunk] = _batch_residual_adf(y[:, chunk], x[:, chunk])
+    tstats = tstats.reshape(2, n_pairs)
+
+    # Select the test with the lowest t-statistics
+    tstat = np.fmin(tstats[0], tstats[1])
+    pvalue = np.array([mackinnonp(t, regression='c', N=2) if not np.isnan(t) else np.nan for t in tstat])
+    return tstat, pvalue
+
+def _batch_residual_adf(y, x):
+    """ADF t-statistic (no trend, AIC lag) of the residuals of y ~ const + x, column by column."""
+    tstat = np.full(y.shape[1], np.nan)
+    constant = (np.ptp(x, axis=0) == 0) | (np.ptp(y, axis=0) == 0) # skipped, as in the per-pair test
+
+    x = x - x.mean(axis=0)
+    y = y - y.mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        beta = (x * y).sum(axis=0) / (x * x).sum(axis=0)
+        resid = y - beta * x
+        rsquared = 1 - (resid * resid).sum(axis=0) / (y * y).sum(axis=0)
+
+    # Edge case where series are too similar
+    collinear = ~constant & (rsquared >= 1 - 100 * np.sqrt(np.finfo(np.double).eps))
+    tstat[collinear] = -np.inf
+
+    valid = np.flatnonzero(~constant & ~collinear)
+    if len(valid):
+        tstat[valid] = _batch_adf_tstat(resid[:, valid])
+    return tstat
+
+def _batch_adf_tstat(resid):
+    """ADF t-statistic without trend, lag chosen by AIC, for every column of resid."""
+    nobs = resid.shape[0]
+    maxlag = int(np.ceil(12.0 * np.power(nobs / 100.0, 1 / 4.0)))
+    maxlag = min(nobs // 2 - 1, maxlag)
+    if maxlag < 0:
+        return np.full(resid.shape[1], np.nan)
+
+    # Lag search on a common sample: regress diff[t] on level[t] and diff[t-1..t-maxlag]
+    diff = np.diff(resid, axis=0)
+    Z, target = _adf_design(resid, diff, maxlag, maxlag)
+    Zt = Z.transpose(0, 2, 1)
+    ZZ = Zt @ Z
+    Zy = (Zt @ target[:, :, None])[:, :, 0]
+    n = Z.shape[1]
+    aic = np.empty((maxlag + 1, resid.shape[1]))
+    for lag in range(maxlag + 1):
+        k = lag + 1
+        params = np.linalg.solve(ZZ[:, :k, :k], Zy[:, :k, None])
+        ssr = ((target - (Z[:, :, :k] @ params)[:, :, 0]) ** 2).sum(axis=1)
+        aic[lag] = n * np.log(ssr / n) + 2 * k
+    bestlag = np.argmin(aic, axis=0) # first minimum, same tie-break as statsmodels
+
+    # Rerun with the best lag on its own (longer) sample
+    tstat = np.empty(resid.shape[1])
+    for lag in np.unique(bestlag):
+        cols = np.flatnonzero(bestlag == lag)
+        Z, target = _adf_design(resid[:, cols], diff[:, cols], lag, lag)
+        Zt = Z.transpose(0, 2, 1)
+        ZZinv = np.linalg.inv(Zt @ Z)
+        params = (ZZinv @ (Zt @ target[:, :, None]))[:, :, 0]
+        ssr = ((target - (Z @ params[:, :, None])[:, :, 0]) ** 2).sum(axis=1)
+        sigma2 = ssr / (Z.shape[1] - Z.shape[2])
+        tstat[cols] = params[:, 0] / np.sqrt(sigma2 * ZZinv[:, 0, 0])
+    return tstat
+
+def _adf_design(level, diff, lags, start):
+    """Stacked ADF regressors (pairs x obs x lags+1) and targets (pairs x obs), starting at diff[start]."""
+    lagged = np.lib.stride_tricks.sliding_window_view(diff[start - lags:-1], lags, axis=0)[:, :, ::-1] \
+        if lags else np.empty((diff.shape[0] - start, diff.shape[1], 0))
+    Z = np.concatenate([level[start:-1, :, None], lagged], axis=2).transpose(1, 0, 2)
+    return np.ascontiguousarray(Z), np.ascontiguousarray(diff[start:].T)
+
 # Hurst Exponent calculation
 def calculate_hurst_exponent(p, lags):
     """
-    Calculate the Hurst Exponent of a time series."""
-    hurst_results = {}
-    for lag in lags: 
-        if lag >= len(p):
-            continue
-        
-        pp = np.subtract(p[lag:], p[:-lag]) # compute price diff
-        variancetau = np.var(pp) # compute variance of the diff
-        log_lag = np.log10(lag)  # logs for regression 
-        log_variance = np.log10(variancetau)
-        hurst = log_variance / log_lag # hurst exponent can be directly calcualted from the log-log slope
-        hurst_results[lag] = hurst/2 # divide by 2
-    return hurst_results 
+    Calculate the Hurst Exponent of a time series.
+
+    Returns:
+        np.ndarray: Hurst exponent per lag, NaN where the lag is too long for the series.
+    """
+    p = np.ascontiguousarray(p, dtype=np.float64)
+    lags = np.asarray(lags, dtype=np.int64)
+    return hurst_kernel(p, lags) # jitted loop over lags
+
+# Output layout of the Hurst exponents: {lag: value}, lags too long for the series left out
+def hurst_dict(lags, hurst):
+    return {lag: h for lag, h in zip(lags, hurst) if not np.isnan(h)}
+
 discrete_lags = [20, 100, 250, 500, 1000]
 
         
 
 
+# AR(1) coefficient of x_t on x_{t-1} with a constant, i.e. cov(x_{t-1}, x_t) / var(x_{t-1})
+@njit(cache=True, nogil=True)
+def _ar1_phi(x):
+    n = x.shape[0] - 1
+    mx = 0.0
+    my = 0.0
+    for i in range(n):
+        mx += x[i]
+        my += x[i + 1]
+    mx /= n
+    my /= n
+    sxy = 0.0
+    sxx = 0.0
+    for i in range(n):
+        a = x[i] - mx
+        sxy += a * (x[i + 1] - my)
+        sxx += a * a
+    if sxx == 0.0:
+        return np.nan
+    return sxy / sxx
+
 # Half-life calculation
 def calculate_half_life(spread):
     """
     Calculate half-life of the mean reversion speed.
     
     Input:
-        spread (pd.Series): Spread series.
+        spread (pd.Series or np.ndarray): Spread series.
     
     Returns:
         float: Half-life in days.
     """
-    spread = spread.dropna()
+    spread = np.asarray(spread, dtype=np.float64)
+    spread = spread[~np.isnan(spread)]
     if len(spread) < 2:
         return np.nan 
     
-    model = AutoReg(spread, lags=1, old_names=False)
-    res = model.fit()
-    phi = res.params[1]
+    # Same slope as AutoReg(spread, lags=1).fit().params[1], in one jitted sweep
+    phi = _ar1_phi(spread)
     
-    if phi >= 1 or phi <= -1:
+    if not (-1 < phi < 1):
         return np.nan  # Non-Stationary process
     
     lambda_param = -np.log(phi)
@@ -133,8 +364,31 @@ def calculate_half_life(spread):
     half_life = np.log(2) / lambda_param
     return half_life
 
+# Half-life of many spreads
+def batch_half_life(spreads):
+    """
+    Calculate half-life of the mean reversion speed for every column of a T x P spread matrix.
+
+    Same AR(1) fit with a constant as calculate_half_life, written as column sums so all
+    spreads are fitted at once.
+
+    Returns:
+        np.ndarray: Half-life in days of each spread.
+    """
+    lagged = spreads[:-1] - spreads[:-1].mean(axis=0)
+    current = spreads[1:] - spreads[1:].mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        phi = np.einsum('tp,tp->p', lagged, current) / np.einsum('tp,tp->p', lagged, lagged)
+        lambda_param = -np.log(phi)
+        half_life = np.log(2) / lambda_param
+
+    # Non-Stationary process or invalid
+    half_life[~((phi > -1) & (phi < 1) & (lambda_param > 0))] = np.nan
+    return half_life
+
 # Pair statistics calculation
-def calculate_pair_statistics(etf1_adj_close, etf2_adj_close, significance_level=0.05, hurst_max_lag=100):
+def calculate_pair_statistics(etf1_adj_close, etf2_adj_close, significance_level=0.05, hurst_max_lag=100,
+                              correlation=None):
     """
     Calculate statistical measures for a pair of ETFs.
 
@@ -143,21 +397,38 @@ def calculate_pair_statistics(etf1_adj_close, etf2_adj_close, significance_level
     Parameters:
         etf1_adj_close (pd.Series): Adjusted close prices for ETF1.
         etf2_adj_close (pd.Series): Adjusted close prices for ETF2. 
+        correlation (float, optional): Return correlation of the pair, e.g. PairFeatureCache.C[i, j].
+            When given, the per-pair Pearson computation is skipped.
 
     Returns:
         dict: A dictionary containing correlation, cointegration p-value, and spread standard deviation.
     """
-    prices = pd.concat([etf1_adj_close, etf2_adj_close], axis=1).dropna()
-    if prices.empty: 
-        return None 
-    
-    etf1, etf2 = prices.columns
-    etf1_series = prices[etf1]
-    etf2_series = prices[etf2]
+    if etf1_adj_close.index.equals(etf2_adj_close.index):
+        # Same dates (always the case for preprocessed prices): a joint NaN mask on the arrays, no join
+        a = etf1_adj_close.to_numpy(dtype=np.float64)
+        b = etf2_adj_close.to_numpy(dtype=np.float64)
+        mask = ~(np.isnan(a) | np.isnan(b))
+        if not mask.any():
+            return None
+        if mask.all():
+            etf1_series, etf2_series = etf1_adj_close, etf2_adj_close
+        else:
+            etf1_series, etf2_series = etf1_adj_close[mask], etf2_adj_close[mask]
+            a, b = a[mask], b[mask]
+    else:
+        prices = pd.concat([etf1_adj_close, etf2_adj_close], axis=1).dropna()
+        if prices.empty: 
+            return None 
+        etf1_series = prices.iloc[:, 0]
+        etf2_series = prices.iloc[:, 1]
+        a = etf1_series.to_numpy(dtype=np.float64)
+        b = etf2_series.to_numpy(dtype=np.float64)
+
+    etf1, etf2 = etf1_series.name, etf2_series.name
     
     # Test for non-stationarity I[1] process
-    non_stationary1 = is_not_stationary(etf1_series, significance_level)
-    non_stationary2 = is_not_stationary(etf2_series, significance_level)
+    non_stationary1 = is_not_stationary_cached(etf1_series, significance_level)
+    non_stationary2 = is_not_stationary_cached(etf2_series, significance_level)
      
     if not (non_stationary1 and non_stationary2):
         return None  # One or both series are stationary, skip this pair
@@ -168,22 +439,26 @@ def calculate_pair_statistics(etf1_adj_close, etf2_adj_close, significance_level
     Cointegration_PValue = coint_test['pvalue']
 
     # Calculate spread
-    spread = etf1_series - etf2_series 
+    spread = a - b
     
     # Calculate Hurst exponent
-    hurst_results = calculate_hurst_exponent(spread.values, discrete_lags)
+    hurst_results = hurst_dict(discrete_lags, calculate_hurst_exponent(spread, discrete_lags))
     
     # Half-life calculation
     half_life = calculate_half_life(spread)
     
-    # Correlation calculation
-    etf1_returns = etf1_series.pct_change().dropna()
-    etf2_returns = etf2_series.pct_change().dropna()
-    corr_result = pearsonr(etf1_returns, etf2_returns)
-    corr_coef = corr_result[0]
+    # Correlation calculation (one lookup when the window's correlation matrix is already available)
+    if correlation is not None:
+        corr_coef = correlation
+    else:
+        # Same value as pearsonr, without its unused p-value
+        etf1_returns = a[1:] / a[:-1] - 1
+        etf2_returns = b[1:] / b[:-1] - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr_coef = np.corrcoef(etf1_returns, etf2_returns)[0, 1]
 
-    # Spread STD Dev
-    spread_std = spread.std()
+    # Spread STD Dev (sample std, as pandas)
+    spread_std = spread.std(ddof=1)
     
     return {
         'Pair': (etf1, etf2),
@@ -195,18 +470,211 @@ def calculate_pair_statistics(etf1_adj_close, etf2_adj_close, significance_level
         'Spread_STD': spread_std
     }
 
+# Pair statistics of many pairs
+def calculate_all_pair_statistics(prices, pair_idx, significance_level=0.05, n_jobs=-1):
+    """
+    Calculate statistical measures for many pairs of ETFs in one call.
+
+    Input:
+        prices (pd.DataFrame): Adjusted close prices, one column per ETF.
+        pair_idx (np.ndarray): pairs x 2 column positions (i, j) into prices.
+        significance_level (float): Significance level of the stationarity tests.
+        n_jobs (int): Number of threads.
+
+    Returns:
+        list: calculate_pair_statistics result (dict, or None) of each pair, in pair_idx order.
+    """
+    pair_idx = np.asarray(pair_idx, dtype=np.int64).reshape(-1, 2)
+    P = prices.to_numpy(dtype=np.float64)
+
+    # Return correlations of all ETFs in one call; with gaps every pair needs its own aligned sample
+    C = None
+    if not np.isnan(P).any():
+        returns = P[1:] / P[:-1] - 1
+        with np.errstate(divide='ignore', invalid='ignore'):
+            C = np.corrcoef(returns, rowvar=False)
+
+    def one_pair(i, j):
+        return calculate_pair_statistics(prices.iloc[:, i], prices.iloc[:, j], significance_level,
+                                         correlation=None if C is None else C[i, j])
+
+    # Threads share the price frame and the ADF / Engle-Granger caches; the NumPy/BLAS and nogil Numba
+    # kernels release the GIL
+    return Parallel(n_jobs=n_jobs, prefer="threads")(delayed(one_pair)(i, j) for i, j in pair_idx)
+
+# Shared per-window features
+class PairFeatureCache:
+    """
+    Price and return matrices of one formation window, built once and shared by the pair selectors.
+
+    Input:
+        formation_data (pd.DataFrame): Formation window with '<ETF>_adj_close' columns (no gaps).
+
+    Attributes:
+        etf_names (list): ETF tickers, in the column order of formation_data.
+        df (pd.DataFrame): Adjusted close prices with one column per ETF, in etf_names order.
+        X (np.ndarray): T x N float64 price matrix.
+        returns (np.ndarray): (T-1) x N daily returns.
+        Xc (np.ndarray): Standardized returns (a zero std is replaced by 1).
+        C (np.ndarray): N x N Pearson correlation of the returns.
+    """
+    def __init__(self, formation_data):
+        # Parsed from the columns every time (one vectorized regex), so selected or added columns are always seen
+        adj_close_cols, col_names = parse_adj_close_columns(formation_data.columns)
+        # File column order, not sorted: OPTICS (xi extraction) depends on the order of its input points
+        self.etf_names = list(dict.fromkeys(col_names))
+        self.etf_idx = {name: i for i, name in enumerate(self.etf_names)}
+
+        self.df = formation_data[adj_close_cols].rename(columns=dict(zip(adj_close_cols, col_names)))[self.etf_names]
+        self.X = np.ascontiguousarray(self.df.to_numpy(dtype=np.float64))
+        self.returns = self.X[1:] / self.X[:-1] - 1
+
+        # Standardize once; the correlation matrix is a single GEMM on the result
+        returns_std = self.returns.std(axis=0, ddof=1)
+        constant = returns_std == 0
+        self.Xc = (self.returns - self.returns.mean(axis=0)) / np.where(constant, 1, returns_std)
+        self.C = (self.Xc.T @ self.Xc) / max(self.returns.shape[0] - 1, 1)
+        self.C[constant, :] = np.nan
+        self.C[:, constant] = np.nan
+
+        self._non_stationary = None
+        self._price_cov = None
+
+        # Struct-of-arrays memo of the pair statistics, symmetric N x N
+        n = len(self.etf_names)
+        self._computed = np.zeros((n, n), dtype=bool)
+        self._pair_stats = {
+            'Correlation': self.C,
+            'Cointegration_TStats': np.full((n, n), np.nan),
+            'Cointegration_PValue': np.full((n, n), np.nan),
+            'Half_Life': np.full((n, n), np.nan),
+            'Spread_STD': np.full((n, n), np.nan),
+            'Valid': np.zeros((n, n), dtype=bool)
+        }
+        self._hurst = {}  # lags -> (computed N x N, N x N x lags Hurst exponents)
+
+    @property
+    def non_stationary(self):
+        """Boolean array, True where the ETF price series is non-stationary (tested once per ETF)."""
+        if self._non_stationary is None:
+            self._non_stationary = np.array([is_not_stationary(self.df[etf]) for etf in self.etf_names], dtype=bool)
+        return self._non_stationary
+
+    def spread_std(self, idx_i, idx_j):
+        """
+        Sample std (ddof=1) of the spreads X[:, i] - X[:, j], as sqrt(S_ii + S_jj - 2 S_ij) from the
+        N x N price covariance matrix instead of materializing a T x pairs spread matrix.
+        """
+        if self._price_cov is None:
+            centered = self.X - self.X.mean(axis=0)
+            self._price_cov = (centered.T @ centered) / max(self.X.shape[0] - 1, 1)
+        S = self._price_cov
+        spread_var = S[idx_i, idx_i] + S[idx_j, idx_j] - 2 * S[idx_i, idx_j]
+        return np.sqrt(np.maximum(spread_var, 0))
+
+    def pair_statistics(self, idx_i, idx_j):
+        """
+        Statistics of the pairs (idx_i[k], idx_j[k]) as a dict of arrays, memoized per pair.
+        'Valid' is False where a leg is stationary. Pairs not seen yet are computed in one batch.
+        """
+        idx_i = np.asarray(idx_i, dtype=np.int64)
+        idx_j = np.asarray(idx_j, dtype=np.int64)
+        todo = ~self._computed[idx_i, idx_j]
+        if todo.any():
+            # statistics don't depend on the order of the legs
+            new = np.unique(np.sort(np.stack([idx_i[todo], idx_j[todo]], axis=1), axis=1), axis=0)
+            new_i, new_j = new[:, 0], new[:, 1]
+
+            # Test for non-stationarity I[1] process on both legs
+            valid = self.non_stationary[new_i] & self.non_stationary[new_j]
+            new_i, new_j = new_i[valid], new_j[valid]
+            tstat, pvalue = batch_cointegration_test(self.X, new_i, new_j)
+            spreads = self.X[:, new_i] - self.X[:, new_j]
+            half_life = batch_half_life(spreads)
+            spread_std = self.spread_std(new_i, new_j)
+
+            for a, b in ((new_i, new_j), (new_j, new_i)):
+                self._pair_stats['Cointegration_TStats'][a, b] = tstat
+                self._pair_stats['Cointegration_PValue'][a, b] = pvalue
+                self._pair_stats['Half_Life'][a, b] = half_life
+                self._pair_stats['Spread_STD'][a, b] = spread_std
+                self._pair_stats['Valid'][a, b] = True
+            self._computed[new[:, 0], new[:, 1]] = True
+            self._computed[new[:, 1], new[:, 0]] = True
+
+        return {name: values[idx_i, idx_j] for name, values in self._pair_stats.items()}
+
+    def hurst_matrix(self, idx_i, idx_j, lags):
+        """
+        Hurst exponents of the spreads of the pairs (idx_i[k], idx_j[k]) as a pairs x lags matrix, memoized per pair.
+        The selectors share most of their pairs within a window, so each spread is only computed once.
+        """
+        idx_i = np.asarray(idx_i, dtype=np.int64)
+        idx_j = np.asarray(idx_j, dtype=np.int64)
+        key = tuple(lags)
+        if key not in self._hurst:
+            n = len(self.etf_names)
+            self._hurst[key] = (np.zeros((n, n), dtype=bool), np.full((n, n, len(key)), np.nan))
+        computed, hurst = self._hurst[key]
+
+        todo = ~computed[idx_i, idx_j]
+        if todo.any():
+            # the spread only changes sign when the legs are swapped, which leaves the Hurst exponent unchanged
+            new = np.unique(np.sort(np.stack([idx_i[todo], idx_j[todo]], axis=1), axis=1), axis=0)
+            new_i, new_j = new[:, 0], new[:, 1]
+            values = calculate_hurst_matrix(self.X, new_i, new_j, key)
+            hurst[new_i, new_j] = values
+            hurst[new_j, new_i] = values
+            computed[new_i, new_j] = True
+            computed[new_j, new_i] = True
+
+        return hurst[idx_i, idx_j]
+
+# Hurst exponent of many spreads
+def calculate_hurst_matrix(X, idx_i, idx_j, lags):
+    """
+    Calculate the Hurst Exponent of the spread X[:, i] - X[:, j] of each pair.
+
+    Returns:
+        np.ndarray: pairs x lags matrix, NaN where the lag is too long for the series.
+    """
+    hurst = np.full((len(idx_i), len(lags)), np.nan)
+    for k, (i, j) in enumerate(zip(idx_i, idx_j)):
+        hurst[k] = calculate_hurst_exponent(X[:, i] - X[:, j], lags)
+    return hurst
+
+# Selector output
+def pair_results_frame(etf_names, idx_i, idx_j, stats, hurst, lags):
+    """
+    Box struct-of-arrays pair statistics into the selectors' DataFrame layout (one row per pair).
+    """
+    return pd.DataFrame({
+        'Pair': [(etf_names[i], etf_names[j]) for i, j in zip(idx_i, idx_j)],
+        'Correlation': stats['Correlation'],
+        'Cointegration_TStats': stats['Cointegration_TStats'],
+        'Cointegration_PValue': stats['Cointegration_PValue'],
+        'Hurst_Exponent': [hurst_dict(lags, row) for row in hurst],
+        'Average_Hurst': np.nanmean(hurst, axis=1) if len(hurst) else np.empty(0),
+        'Half_Life': stats['Half_Life'],
+        'Spread_STD': stats['Spread_STD']
+    })
+
 # Feature extraction
-def extract_features(etf_prices):
+def extract_features(etf_prices, etf_returns=None):
     """
     Extract features from ETF price data.
     
     Input:
         etf_prices (pd.Series): Adjusted close prices for an ETF.
+        etf_returns (pd.Series, optional): Daily returns of the ETF, when the caller already has them.
+            Computed from etf_prices when not given.
     
     Returns:
         dict: A dictionary containing feature metrics like mean return, standard deviation, skewness, etc.
     """
-    etf_returns = etf_prices.pct_change().dropna()
+    if etf_returns is None:
+        etf_returns = etf_prices.pct_change()
+    etf_returns = etf_returns.dropna()
     features = {
         'Mean_Return': etf_returns.mean(),
         'Std_Return': etf_returns.std(),